@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+OsmAnd to QGIS Style Converter
+
+Runs the point and road converters back to back on a single parse of
+OsmAnd's default.render.xml and writes their styles to the examples directory.
+
+Usage:
+  python osmand2qgis.py [--pretty]
+"""
+
+import argparse
+import os
+
+from osmand_render import OSMAND_XML, ICONS_DIR, SHIELDS_DIR
+import osmand2qgis_point
+import osmand2qgis_road
+
+def convert_all(osmand_xml=OSMAND_XML, output_dir="examples", pretty=False):
+    """Convert points and roads, parsing the OsmAnd XML only once."""
+    os.makedirs(output_dir, exist_ok=True)
+
+    # The point converter walks the shared tree instead of streaming the file,
+    # so the road converter gets the same tree back from the loader's cache
+    osmand2qgis_point.generate_qgis_style(
+        osmand_xml, ICONS_DIR, SHIELDS_DIR, os.path.join(output_dir, "points.xml"),
+        stream=False, pretty=pretty
+    )
+    osmand2qgis_road.generate_qgis_style(osmand_xml, os.path.join(output_dir, "roads.xml"), pretty=pretty)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert OsmAnd point and road styles to QGIS style XML files.")
+    parser.add_argument('--pretty', action='store_true', help="indent the output XML")
+    args = parser.parse_args()
+    
+    convert_all(pretty=args.pretty)
+
+if __name__ == "__main__":
+    main()
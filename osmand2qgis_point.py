@@ -9,220 +9,247 @@ encodes the corresponding SVG files as base64, and generates QGIS symbol definit
 The resulting QGIS style XML can be imported into QGIS to reproduce OSMAnd-style point symbology.
 
 Main functionalities:
-- Parses the OSMAnd rendering style XML to extract relevant <case> elements with tag, value, and icon attributes.
+- Streams the OSMAnd rendering style XML to extract relevant <case> elements with tag, value, and icon attributes.
 - Locates and base64-encodes the corresponding SVG icon and shield files.
-- Constructs QGIS symbol XML elements with the encoded SVGs as marker layers.
+- Renders QGIS symbol XML from a template with the encoded SVGs as marker layers.
 - Handles duplicate symbols, missing shields, and missing files with informative statistics.
-- Outputs a formatted QGIS style XML file with all generated symbols.
+- Outputs a compact (or, with --pretty, indented) QGIS style XML file with all generated symbols.
 
 Requirements:
 - lxml library for XML parsing and generation.
+- Optionally pybase64 for faster base64 encoding (falls back to the standard library).
 - Access to the OSMAnd rendering style XML and the corresponding SVG icon and shield directories.
 
 Usage:
-  python osmand2qgis_point.py
+  python osmand2qgis_point.py [--pretty]
 """
 
 from lxml import etree as ET
-from os.path import join, exists
-import base64
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join
+from xml.sax.saxutils import escape
+try:
+  # SIMD-accelerated drop-in replacement for the standard library module
+  import pybase64 as base64
+except ImportError:
+  import base64
+import argparse
+import functools
 import uuid
+import re
 import os
 
-def create_qgis_symbol(value, icon_base64, shield_base64):
-  """Create a QGIS symbol XML element"""
-  # Create symbol element
-  symbol = ET.Element("symbol")
-  symbol.set("type", "marker")
-  symbol.set("frame_rate", "10")
-  symbol.set("tags", "OSMAnd")
-  symbol.set("clip_to_extent", "1")
-  symbol.set("is_animated", "0")
-  symbol.set("force_rhr", "0")
-  symbol.set("name", value)
-  symbol.set("alpha", "1")
-
-  # Data defined properties for symbol
-  ddp_symbol = ET.SubElement(symbol, "data_defined_properties")
-  option_symbol = ET.SubElement(ddp_symbol, "Option")
-  option_symbol.set("type", "Map")
-  name_opt = ET.SubElement(option_symbol, "Option")
-  name_opt.set("type", "QString")
-  name_opt.set("value", "")
-  name_opt.set("name", "name")
-  props_opt = ET.SubElement(option_symbol, "Option")
-  props_opt.set("name", "properties")
-  type_opt = ET.SubElement(option_symbol, "Option")
-  type_opt.set("type", "QString")
-  type_opt.set("value", "collection")
-  type_opt.set("name", "type")
-
-  # First layer - Shield (background)
-  layer1 = ET.SubElement(symbol, "layer")
-  layer1.set("pass", "0")
-  layer1.set("enabled", "1")
-  layer1.set("class", "SvgMarker")
-  layer1.set("locked", "0")
-
-  option1 = ET.SubElement(layer1, "Option")
-  option1.set("type", "Map")
-
-  # Shield layer options
-  shield_options = [
-    ("angle", "QString", "0"),
-    ("color", "QString", "255,255,255,255,rgb:1,1,1,1"),
-    ("fixedAspectRatio", "QString", "0"),
-    ("horizontal_anchor_point", "QString", "1"),
-    ("name", "QString", shield_base64),
-    ("offset", "QString", "0,0"),
-    ("offset_map_unit_scale", "QString", "3x:0,0,0,0,0,0"),
-    ("offset_unit", "QString", "MM"),
-    ("outline_color", "QString", "255,255,255,255,rgb:1,1,1,1"),
-    ("outline_width", "QString", "0.4"),
-    ("outline_width_map_unit_scale", "QString", "3x:0,0,0,0,0,0"),
-    ("outline_width_unit", "QString", "MM"),
-    ("scale_method", "QString", "diameter"),
-    ("size", "QString", "6.8"),
-    ("size_map_unit_scale", "QString", "3x:0,0,0,0,0,0"),
-    ("size_unit", "QString", "MM"),
-    ("vertical_anchor_point", "QString", "1")
-  ]
+from osmand_render import OSMAND_XML, ICONS_DIR, SHIELDS_DIR, load_osmand_tree
+
+# QGIS marker symbol with a shield layer under an icon layer. Everything but the
+# name and the two base64 SVGs is static, so symbols are rendered from text
+# instead of being built node by node.
+_SYMBOL_TEMPLATE = """\
+    <symbol type="marker" frame_rate="10" tags="OSMAnd" clip_to_extent="1" is_animated="0" force_rhr="0" name="{name}" alpha="1">
+      <data_defined_properties>
+        <Option type="Map">
+          <Option type="QString" value="" name="name"/>
+          <Option name="properties"/>
+          <Option type="QString" value="collection" name="type"/>
+        </Option>
+      </data_defined_properties>
+      <layer pass="0" enabled="1" class="SvgMarker" locked="0">
+        <Option type="Map">
+          <Option type="QString" value="0" name="angle"/>
+          <Option type="QString" value="255,255,255,255,rgb:1,1,1,1" name="color"/>
+          <Option type="QString" value="0" name="fixedAspectRatio"/>
+          <Option type="QString" value="1" name="horizontal_anchor_point"/>
+          <Option type="QString" value="{shield_base64}" name="name"/>
+          <Option type="QString" value="0,0" name="offset"/>
+          <Option type="QString" value="3x:0,0,0,0,0,0" name="offset_map_unit_scale"/>
+          <Option type="QString" value="MM" name="offset_unit"/>
+          <Option type="QString" value="255,255,255,255,rgb:1,1,1,1" name="outline_color"/>
+          <Option type="QString" value="0.4" name="outline_width"/>
+          <Option type="QString" value="3x:0,0,0,0,0,0" name="outline_width_map_unit_scale"/>
+          <Option type="QString" value="MM" name="outline_width_unit"/>
+          <Option type="QString" value="diameter" name="scale_method"/>
+          <Option type="QString" value="6.8" name="size"/>
+          <Option type="QString" value="3x:0,0,0,0,0,0" name="size_map_unit_scale"/>
+          <Option type="QString" value="MM" name="size_unit"/>
+          <Option type="QString" value="1" name="vertical_anchor_point"/>
+          <Option name="parameters"/>
+        </Option>
+        <data_defined_properties>
+          <Option type="Map">
+            <Option type="QString" value="" name="name"/>
+            <Option name="properties"/>
+            <Option type="QString" value="collection" name="type"/>
+          </Option>
+        </data_defined_properties>
+      </layer>
+      <layer pass="0" enabled="1" class="SvgMarker" locked="0">
+        <Option type="Map">
+          <Option type="QString" value="0" name="angle"/>
+          <Option type="QString" value="255,255,255,255,rgb:1,1,1,1" name="color"/>
+          <Option type="QString" value="0" name="fixedAspectRatio"/>
+          <Option type="QString" value="1" name="horizontal_anchor_point"/>
+          <Option type="QString" value="{icon_base64}" name="name"/>
+          <Option type="QString" value="0,0" name="offset"/>
+          <Option type="QString" value="3x:0,0,0,0,0,0" name="offset_map_unit_scale"/>
+          <Option type="QString" value="MM" name="offset_unit"/>
+          <Option type="QString" value="255,255,255,255,rgb:1,1,1,1" name="outline_color"/>
+          <Option type="QString" value="0.1" name="outline_width"/>
+          <Option type="QString" value="3x:0,0,0,0,0,0" name="outline_width_map_unit_scale"/>
+          <Option type="QString" value="MM" name="outline_width_unit"/>
+          <Option type="QString" value="diameter" name="scale_method"/>
+          <Option type="QString" value="4.4" name="size"/>
+          <Option type="QString" value="3x:0,0,0,0,0,0" name="size_map_unit_scale"/>
+          <Option type="QString" value="MM" name="size_unit"/>
+          <Option type="QString" value="1" name="vertical_anchor_point"/>
+          <Option name="parameters"/>
+        </Option>
+        <data_defined_properties>
+          <Option type="Map">
+            <Option type="QString" value="" name="name"/>
+            <Option name="properties"/>
+            <Option type="QString" value="collection" name="type"/>
+          </Option>
+        </data_defined_properties>
+      </layer>
+    </symbol>
+"""
 
-  for name, opt_type, value in shield_options:
-    opt = ET.SubElement(option1, "Option")
-    opt.set("type", opt_type)
-    opt.set("value", value)
-    opt.set("name", name)
-
-  # Parameters option for shield
-  params_opt1 = ET.SubElement(option1, "Option")
-  params_opt1.set("name", "parameters")
-
-  # Data defined properties for shield layer
-  ddp1 = ET.SubElement(layer1, "data_defined_properties")
-  option_ddp1 = ET.SubElement(ddp1, "Option")
-  option_ddp1.set("type", "Map")
-  name_ddp1 = ET.SubElement(option_ddp1, "Option")
-  name_ddp1.set("type", "QString")
-  name_ddp1.set("value", "")
-  name_ddp1.set("name", "name")
-  props_ddp1 = ET.SubElement(option_ddp1, "Option")
-  props_ddp1.set("name", "properties")
-  type_ddp1 = ET.SubElement(option_ddp1, "Option")
-  type_ddp1.set("type", "QString")
-  type_ddp1.set("value", "collection")
-  type_ddp1.set("name", "type")
-
-  # Second layer - Icon
-  layer2 = ET.SubElement(symbol, "layer")
-  layer2.set("pass", "0")
-  layer2.set("enabled", "1")
-  layer2.set("class", "SvgMarker")
-  layer2.set("locked", "0")
-
-  option2 = ET.SubElement(layer2, "Option")
-  option2.set("type", "Map")
-
-  # Icon layer options
-  icon_options = [
-    ("angle", "QString", "0"),
-    ("color", "QString", "255,255,255,255,rgb:1,1,1,1"),
-    ("fixedAspectRatio", "QString", "0"),
-    ("horizontal_anchor_point", "QString", "1"),
-    ("name", "QString", icon_base64),
-    ("offset", "QString", "0,0"),
-    ("offset_map_unit_scale", "QString", "3x:0,0,0,0,0,0"),
-    ("offset_unit", "QString", "MM"),
-    ("outline_color", "QString", "255,255,255,255,rgb:1,1,1,1"),
-    ("outline_width", "QString", "0.1"),
-    ("outline_width_map_unit_scale", "QString", "3x:0,0,0,0,0,0"),
-    ("outline_width_unit", "QString", "MM"),
-    ("scale_method", "QString", "diameter"),
-    ("size", "QString", "4.4"),
-    ("size_map_unit_scale", "QString", "3x:0,0,0,0,0,0"),
-    ("size_unit", "QString", "MM"),
-    ("vertical_anchor_point", "QString", "1")
-  ]
+_STYLE_PROLOG = """\
+<?xml version='1.0' encoding='UTF-8'?>
+<!DOCTYPE qgis_style>
+"""
 
-  for name, opt_type, value in icon_options:
-    opt = ET.SubElement(option2, "Option")
-    opt.set("type", opt_type)
-    opt.set("value", value)
-    opt.set("name", name)
-
-  # Parameters option for icon
-  params_opt2 = ET.SubElement(option2, "Option")
-  params_opt2.set("name", "parameters")
-
-  # Data defined properties for icon layer
-  ddp2 = ET.SubElement(layer2, "data_defined_properties")
-  option_ddp2 = ET.SubElement(ddp2, "Option")
-  option_ddp2.set("type", "Map")
-  name_ddp2 = ET.SubElement(option_ddp2, "Option")
-  name_ddp2.set("type", "QString")
-  name_ddp2.set("value", "")
-  name_ddp2.set("name", "name")
-  props_ddp2 = ET.SubElement(option_ddp2, "Option")
-  props_ddp2.set("name", "properties")
-  type_ddp2 = ET.SubElement(option_ddp2, "Option")
-  type_ddp2.set("type", "QString")
-  type_ddp2.set("value", "collection")
-  type_ddp2.set("name", "type")
-
-  return symbol
-
-def find_shield_value(case_element):
-  """Find shield value from case element or its parents"""
-  # First check if the case itself has a shield attribute
-  if 'shield' in case_element.attrib:
-    return case_element.attrib['shield']
-
-  # Walk up the parent tree to find shield attribute
-  parent = case_element.getparent()
-  while parent is not None:
-    if parent.tag == 'switch' and 'shield' in parent.attrib:
-      return parent.attrib['shield']
-    elif parent.tag == 'apply' and 'shield' in parent.attrib:
-      return parent.attrib['shield']
-    parent = parent.getparent()
-
-  return None
+_STYLE_HEADER = """\
+<qgis_style version="2">
+  <symbols>
+"""
 
-def main():
-  osmand_xml = join("OsmAnd-resources", "rendering_styles", "default.render.xml")
-  icons_dir = join("OsmAnd-resources", "rendering_styles", "style-icons", "poi-icons-svg")
-  shields_dir = join("OsmAnd-resources", "icons", "svg", "shields")
-
-  tree = ET.parse(osmand_xml)
-  root = tree.getroot()
-  # Search for all case elements with tag, value, and icon attributes anywhere in the XML
-  cases = root.findall(".//case[@tag][@value][@icon]")
-  print(f"Found {len(cases)} <case> entries with tag, value, and icon attributes.")
-
-  # Create root QGIS style element
-  qgis_style = ET.Element("qgis_style")
-  qgis_style.set("version", "2")
-
-  # Create symbols container
-  symbols_container = ET.SubElement(qgis_style, "symbols")
-
-  # Create empty containers for other QGIS style elements
-  ET.SubElement(qgis_style, "colorramps")
-  ET.SubElement(qgis_style, "textformats")
-  ET.SubElement(qgis_style, "labelsettings")
-  ET.SubElement(qgis_style, "legendpatchshapes")
-  ET.SubElement(qgis_style, "symbols3d")
+_STYLE_FOOTER = """\
+  </symbols>
+  <colorramps/>
+  <textformats/>
+  <labelsettings/>
+  <legendpatchshapes/>
+  <symbols3d/>
+</qgis_style>
+"""
+
+def _compact(xml):
+  """Drop the indentation between the tags of a pretty printed XML fragment"""
+  return re.sub(r">\s+<", "><", xml).strip()
+
+# Document text around the symbols, keyed by whether the output is pretty printed
+_STYLE_PARTS = {
+  True: ((_STYLE_PROLOG + _STYLE_HEADER).encode("utf-8"), _STYLE_FOOTER.encode("utf-8")),
+  False: ((_STYLE_PROLOG + _compact(_STYLE_HEADER)).encode("utf-8"), _compact(_STYLE_FOOTER).encode("utf-8"))
+}
+
+# Symbol text before and after the name, keyed the same way. Everything after
+# the name only depends on the SVG pair, which many symbols share
+_SYMBOL_PARTS = {
+  True: _SYMBOL_TEMPLATE.split("{name}"),
+  False: _compact(_SYMBOL_TEMPLATE).split("{name}")
+}
+
+@functools.lru_cache(maxsize=None)
+def _render_symbol_tail(icon_base64, shield_base64, pretty):
+  """Render the part of a symbol following its name, once per SVG pair"""
+  tail = _SYMBOL_PARTS[pretty][1]
+  return tail.format(icon_base64=icon_base64, shield_base64=shield_base64).encode("utf-8")
+
+def create_qgis_symbol(value, icon_base64, shield_base64, pretty=False):
+  """Render a QGIS symbol as UTF-8 encoded XML"""
+  # The base64 alphabet needs no escaping, only the symbol name does
+  head = _SYMBOL_PARTS[pretty][0]
+  name = escape(value, {'"': "&quot;"})
+  return (head + name).encode("utf-8") + _render_symbol_tail(icon_base64, shield_base64, pretty)
+
+@functools.lru_cache(maxsize=None)
+def _encode_svg(path):
+  """Return the SVG file at path as a QGIS base64 string, reading each file once"""
+  with open(path, "rb") as f:
+    encoded = base64.b64encode(f.read()).decode("utf-8")
+  return f"base64:{encoded}"
+
+def _list_files(directory):
+  """Return the names of the entries in directory, or an empty set if it is missing"""
+  try:
+    with os.scandir(directory) as entries:
+      return frozenset(entry.name for entry in entries)
+  except FileNotFoundError:
+    return frozenset()
+
+def iter_icon_cases(source):
+  """Stream <case> elements with tag, value, and icon attributes from the OSMAnd XML
+
+  Yields (case, shield) pairs, where shield comes from the case itself or the
+  nearest enclosing switch/apply element, tracked on a stack while parsing.
+  Cases are yielded on their start event so the original document order is kept.
+  A file path is streamed and its cases are cleared once fully parsed so memory
+  stays bounded by the nesting depth; an already parsed tree is walked in place
+  and left untouched.
+  """
+  tags = ("case", "switch", "apply")
+  streaming = isinstance(source, (str, os.PathLike))
+  if streaming:
+    events = ET.iterparse(source, events=("start", "end"), tag=tags)
+  else:
+    events = ET.iterwalk(source, events=("start", "end"), tag=tags)
+
+  # Effective shield of each open switch/apply, with None for the document level
+  shield_stack = [None]
+  for event, elem in events:
+    if elem.tag != "case":
+      if event == "start":
+        shield_stack.append(elem.get("shield", shield_stack[-1]))
+      else:
+        shield_stack.pop()
+      continue
+
+    if event == "start":
+      if "tag" in elem.attrib and "value" in elem.attrib and "icon" in elem.attrib:
+        yield elem, elem.get("shield", shield_stack[-1])
+      continue
+
+    if not streaming:
+      continue
 
+    # Drop the finished case and everything parsed before it along the ancestor chain
+    elem.clear(keep_tail=True)
+    node = elem
+    parent = node.getparent()
+    while parent is not None:
+      while node.getprevious() is not None:
+        del parent[0]
+      node = parent
+      parent = node.getparent()
+
+def generate_qgis_style(osmand_xml, icons_dir, shields_dir, output_path, stream=True, pretty=False):
+  """Generate QGIS style XML for point features from OSMAnd rendering XML
+
+  The OSMAnd XML is streamed by default, with stream=False the tree shared
+  through load_osmand_tree is used instead. The output is compact unless
+  pretty is set.
+  """
+  source = osmand_xml if stream else load_osmand_tree(osmand_xml)
+
+  # List the SVG directories once instead of stat'ing every candidate file
+  icon_files = _list_files(icons_dir)
+  shield_files = _list_files(shields_dir)
+
+  pending = []
+  found_count = 0
   processed_count = 0
   skipped_no_shield = 0
   skipped_no_files = 0
   skipped_duplicates = 0
+  seen_names = set()
 
-  for c in cases:
-    attrs = dict(c.attrib)
-    icon_name = attrs.get("icon", "").strip()
-    tag = attrs.get("tag", "").strip()
-    value = attrs.get("value", "").strip()
+  for c, shield in iter_icon_cases(source):
+    found_count += 1
+    icon_name = c.get("icon", "").strip()
+    tag = c.get("tag", "").strip()
+    value = c.get("value", "").strip()
 
     if not tag or not value or not icon_name:
       continue
@@ -231,68 +258,65 @@ def main():
     symbol_name = f"{tag}:{value}"
 
     # Skip duplicates based on tag:value combination
-    existing_symbols = symbols_container.findall(f".//symbol[@name='{symbol_name}']")
-    if existing_symbols:
+    if symbol_name in seen_names:
       skipped_duplicates += 1
       continue
 
-    # Find shield value (check case element and parent elements)
-    shield = find_shield_value(c)
+    # Shield comes from the case itself or its enclosing switch/apply
     if not shield:
       skipped_no_shield += 1
       continue
 
-    icon_path = join(icons_dir, f"mx_{icon_name}.svg")
-    if not exists(icon_path):
+    icon_file = f"mx_{icon_name}.svg"
+    if icon_file not in icon_files:
       skipped_no_files += 1
       continue
-    with open(icon_path, "rb") as f:
-      encoded = base64.b64encode(f.read()).decode("utf-8")
-      icon_base64 = f"base64:{encoded}"
 
-    shield_path = join(shields_dir, f"h_{shield}.svg") if shield else None
-    if not shield_path or not exists(shield_path):
+    shield_file = f"h_{shield}.svg"
+    if shield_file not in shield_files:
       skipped_no_files += 1
       continue
-    with open(shield_path, "rb") as f:
-      encoded = base64.b64encode(f.read()).decode("utf-8")
-      shield_base64 = f"base64:{encoded}"
 
-    # Create symbol and add to symbols container
-    symbol = create_qgis_symbol(symbol_name, icon_base64, shield_base64)
-    symbols_container.append(symbol)
+    pending.append((symbol_name, join(icons_dir, icon_file), join(shields_dir, shield_file)))
+    seen_names.add(symbol_name)
     processed_count += 1
 
+  # Encode each distinct SVG once, on a thread pool so the file reads overlap
+  svg_paths = list(dict.fromkeys(path for _, icon_path, shield_path in pending for path in (icon_path, shield_path)))
+  with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+    encoded = dict(zip(svg_paths, executor.map(_encode_svg, svg_paths)))
+
+  symbols = [
+    create_qgis_symbol(symbol_name, encoded[icon_path], encoded[shield_path], pretty)
+    for symbol_name, icon_path, shield_path in pending
+  ]
+
+  print(f"Found {found_count} <case> entries with tag, value, and icon attributes.")
   print(f"Converted {processed_count} symbols.")
   print(f"Skipped {skipped_duplicates} duplicates.")
   print(f"Skipped {skipped_no_shield} without shield.")
   print(f"Skipped {skipped_no_files} due to missing files.")
 
-  # Write XML output
-  output_path = join("examples", "points.xml")
-  
-  # Create output directory if it doesn't exist
-  os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-  # Format the XML with proper indentation
-  ET.indent(qgis_style, space="  ")
+  # Write the rendered symbols inside the QGIS style document
+  header, footer = _STYLE_PARTS[pretty]
+  with open(output_path, "wb") as f:
+    f.write(header)
+    f.write(b"".join(symbols))
+    f.write(footer)
 
-  # Create tree and write to file
-  tree = ET.ElementTree(qgis_style)
-  tree.write(output_path, encoding="utf-8", xml_declaration=True)
+  print(f"Wrote QGIS style XML to {output_path}")
 
-  # Add DOCTYPE declaration manually
-  with open(output_path, "r", encoding="utf-8") as f:
-    content = f.read()
+def main():
+  parser = argparse.ArgumentParser(description="Convert OSMAnd point styles to a QGIS style XML file.")
+  parser.add_argument("--pretty", action="store_true", help="indent the output XML")
+  args = parser.parse_args()
 
-  # Replace XML declaration with DOCTYPE
-  content = content.replace('<?xml version=\'1.0\' encoding=\'utf-8\'?>',
-                           '<?xml version=\'1.0\' encoding=\'utf-8\'?>\n<!DOCTYPE qgis_style>')
+  output_path = join("examples", "points.xml")
 
-  with open(output_path, "w", encoding="utf-8") as f:
-    f.write(content)
+  # Create output directory if it doesn't exist
+  os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-  print(f"Wrote QGIS style XML to {output_path}")
+  generate_qgis_style(OSMAND_XML, ICONS_DIR, SHIELDS_DIR, output_path, pretty=args.pretty)
 
 
 if __name__ == "__main__":
@@ -7,9 +7,14 @@ It parses the routeInfo_roadClass elements and creates QGIS line symbols with st
 """
 
 from lxml import etree
-import re
+from copy import deepcopy
+import argparse
+import functools
 import os
 
+from osmand_render import OSMAND_XML, load_osmand_tree
+
+@functools.lru_cache(maxsize=None)
 def hex_to_rgb(hex_color):
     """Convert hex color to RGB values."""
     hex_color = hex_color.lstrip('#')
@@ -30,32 +35,20 @@ def resolve_color_variable(color_var, color_definitions):
         return color_var
     return "#000000"  # default black
 
+# Color rendering attributes, and their cases that define a literal hex color
+_COLOR_XP = etree.XPath(".//renderingAttribute[contains(@name, 'Color')]")
+_CASE_XP = etree.XPath(".//case[starts-with(@attrColorValue, '#')]")
+
 def extract_color_definitions(root):
     """Extract color definitions from rendering attributes."""
     color_defs = {}
     
-    # Find all renderingAttribute elements
-    for attr in root.xpath('.//renderingAttribute'):
-        attr_name = attr.get('name')
-        if attr_name and 'Color' in attr_name:
-            # Look for the default case (last case without conditions or with minimal conditions)
-            cases = attr.xpath('.//case[@attrColorValue]')
-            if cases:
-                # Get the case with the simplest condition (fewer attributes) or the last one
-                best_case = None
-                min_attrs = float('inf')
-                
-                for case in cases:
-                    # Count attributes (conditions)
-                    attr_count = len([k for k in case.attrib.keys() if k not in ['attrColorValue']])
-                    color_value = case.get('attrColorValue')
-                    
-                    if color_value and color_value.startswith('#') and attr_count < min_attrs:
-                        min_attrs = attr_count
-                        best_case = case
-                
-                if best_case is not None:
-                    color_defs[attr_name] = best_case.get('attrColorValue')
+    for attr in _COLOR_XP(root):
+        cases = _CASE_XP(attr)
+        if cases:
+            # Use the case with the simplest condition (fewest attributes), the first one on ties
+            best_case = min(cases, key=lambda case: len(case.attrib))
+            color_defs[attr.get('name')] = best_case.get('attrColorValue')
     
     # Add fallback colors for variables that resolve to other variables
     manual_colors = {
@@ -74,31 +67,31 @@ def extract_color_definitions(root):
             
     return color_defs
 
+# Nested cases that define a stroke width, in document order
+_SW_CASES_XP = etree.XPath('.//apply//case[@strokeWidth]')
+
 def extract_stroke_width_for_zoom(case_elem, zoom_level=16):
     """Extract stroke width for a specific zoom level from case element."""
-    # Look for strokeWidth patterns for the given zoom level
-    stroke_width_attrs = [
-        f'maxzoom="{zoom_level}" strokeWidth=',
-        f'minzoom="{zoom_level}" strokeWidth=',
-        'strokeWidth='
-    ]
+    # Prefer a case bounded at this zoom level or not bounded at all,
+    # otherwise use the first width found
+    zoom = str(zoom_level)
+    first_width = None
+    for case_child in _SW_CASES_XP(case_elem):
+        # Parse width like "4:4" or "4.5:4.5", skipping values that are not
+        # plain numbers, such as variable references
+        try:
+            width = float(case_child.get('strokeWidth').partition(':')[0])
+        except ValueError:
+            continue
+        
+        zooms = (case_child.get('minzoom'), case_child.get('maxzoom'))
+        if zoom in zooms or zooms == (None, None):
+            return width
+        if first_width is None:
+            first_width = width
     
-    # Try to find strokeWidth in nested apply elements
-    for apply_elem in case_elem.xpath('.//apply'):
-        for case_child in apply_elem.xpath('.//case'):
-            case_str = etree.tostring(case_child, encoding='unicode')
-            for attr_pattern in stroke_width_attrs:
-                if attr_pattern in case_str:
-                    # Extract the stroke width value
-                    pattern = f'{attr_pattern}"([^"]*)"'
-                    match = re.search(pattern, case_str)
-                    if match:
-                        width_str = match.group(1)
-                        # Parse width like "4:4" or "4.5:4.5"
-                        if ':' in width_str:
-                            return float(width_str.split(':')[0])
-                        else:
-                            return float(width_str)
+    if first_width is not None:
+        return first_width
     
     # Default fallback widths based on road type if not found
     return 2.0
@@ -107,18 +100,25 @@ def extract_road_info(root, color_definitions):
     """Extract road information from the line rendering section."""
     roads = []
     
+    # Road colors repeat heavily, resolve each variable only once
+    @functools.lru_cache(maxsize=None)
+    def resolve_color(color_var):
+        return resolve_color_variable(color_var, color_definitions)
+    
     # Find the line section with highway rendering
-    line_section = root.xpath('.//line')[0]
+    line_section = next(root.iter('line'))
     
     # Look for switch elements containing highway cases in high zoom levels
     # Find switches with minzoom="14" which contain the main road rendering
-    high_zoom_switches = line_section.xpath('.//switch[@minzoom="14"]')
+    high_zoom_switches = (
+        switch for switch in line_section.iter('switch') if switch.get('minzoom') == '14'
+    )
     
     processed_highways = set()  # To avoid duplicates
     
     for switch in high_zoom_switches:
-        # Find all highway cases in this switch
-        highway_cases = switch.xpath('.//case[@tag="highway"][@value][@color]')
+        # Walk the highway cases in this switch, the checks below skip the others
+        highway_cases = (case for case in switch.iter('case') if case.get('tag') == 'highway')
         
         for case in highway_cases:
             tag = case.get('tag')
@@ -129,7 +129,7 @@ def extract_road_info(root, color_definitions):
                 processed_highways.add(value)
                 
                 # Resolve color variable
-                resolved_color = resolve_color_variable(color_attr, color_definitions)
+                resolved_color = resolve_color(color_attr)
                 
                 # Create symbol name
                 symbol_name = f"Road {value.replace('_', ' ').title()}"
@@ -162,7 +162,7 @@ def extract_road_info(root, color_definitions):
     
     for road_info in additional_roads:
         if road_info['value'] not in processed_highways:
-            resolved_color = resolve_color_variable(road_info['color_var'], color_definitions)
+            resolved_color = resolve_color(road_info['color_var'])
             symbol_name = f"Road {road_info['value'].replace('_', ' ').title()}"
             
             roads.append({
@@ -177,47 +177,41 @@ def extract_road_info(root, color_definitions):
     
     return roads
 
-def create_qgis_symbol(road_info, main_width_ratio=0.8):
-    """Create a QGIS line symbol XML element."""
-    stroke_width = road_info.get('stroke_width', 1.5)  # Use extracted width
-    
-    symbol = etree.Element('symbol')
-    symbol.set('type', 'line')
-    symbol.set('frame_rate', '10')
-    symbol.set('tags', 'OSMAnd')
-    symbol.set('clip_to_extent', '1')
-    symbol.set('is_animated', '0')
-    symbol.set('force_rhr', '0')
-    symbol.set('name', road_info['symbol_name'])
-    symbol.set('alpha', '1')
+def create_data_defined_properties():
+    """Create an empty data defined properties block for a symbol or layer."""
+    data_props = etree.Element('data_defined_properties')
+    option = etree.SubElement(data_props, 'Option', attrib={'type': 'Map'})
+    etree.SubElement(option, 'Option', attrib={'type': 'QString', 'value': '', 'name': 'name'})
+    etree.SubElement(option, 'Option', attrib={'name': 'properties'})
+    etree.SubElement(option, 'Option', attrib={'type': 'QString', 'value': 'collection', 'name': 'type'})
+    
+    return data_props
+
+# Built once and cloned into every symbol and layer
+_DATA_DEFINED_PROPERTIES = create_data_defined_properties()
+
+def create_line_symbol_template():
+    """Create a QGIS line symbol XML element with empty name, widths and main color."""
+    symbol = etree.Element('symbol', attrib={
+        'type': 'line',
+        'frame_rate': '10',
+        'tags': 'OSMAnd',
+        'clip_to_extent': '1',
+        'is_animated': '0',
+        'force_rhr': '0',
+        'name': '',
+        'alpha': '1'
+    })
     
     # Data defined properties
-    data_props = etree.SubElement(symbol, 'data_defined_properties')
-    option = etree.SubElement(data_props, 'Option')
-    option.set('type', 'Map')
-    
-    name_option = etree.SubElement(option, 'Option')
-    name_option.set('type', 'QString')
-    name_option.set('value', '')
-    name_option.set('name', 'name')
-    
-    props_option = etree.SubElement(option, 'Option')
-    props_option.set('name', 'properties')
-    
-    type_option = etree.SubElement(option, 'Option')
-    type_option.set('type', 'QString')
-    type_option.set('value', 'collection')
-    type_option.set('name', 'type')
+    symbol.append(deepcopy(_DATA_DEFINED_PROPERTIES))
     
     # Stroke layer (first layer, pass 0)
-    stroke_layer = etree.SubElement(symbol, 'layer')
-    stroke_layer.set('pass', '0')
-    stroke_layer.set('enabled', '1')
-    stroke_layer.set('class', 'SimpleLine')
-    stroke_layer.set('locked', '0')
+    stroke_layer = etree.SubElement(symbol, 'layer', attrib={
+        'pass': '0', 'enabled': '1', 'class': 'SimpleLine', 'locked': '0'
+    })
     
-    stroke_option = etree.SubElement(stroke_layer, 'Option')
-    stroke_option.set('type', 'Map')
+    stroke_option = etree.SubElement(stroke_layer, 'Option', attrib={'type': 'Map'})
     
     # Stroke layer properties
     stroke_props = {
@@ -233,7 +227,7 @@ def create_qgis_symbol(road_info, main_width_ratio=0.8):
         'joinstyle': 'bevel',
         'line_color': hex_to_rgb('#565656'),  # Dark gray for stroke
         'line_style': 'solid',
-        'line_width': str(stroke_width),
+        'line_width': '',
         'line_width_unit': 'MM',
         'offset': '0',
         'offset_map_unit_scale': '3x:0,0,0,0,0,0',
@@ -251,41 +245,19 @@ def create_qgis_symbol(road_info, main_width_ratio=0.8):
     }
     
     for prop_name, prop_value in stroke_props.items():
-        prop_elem = etree.SubElement(stroke_option, 'Option')
-        prop_elem.set('type', 'QString')
-        prop_elem.set('value', prop_value)
-        prop_elem.set('name', prop_name)
+        etree.SubElement(stroke_option, 'Option', attrib={'type': 'QString', 'value': prop_value, 'name': prop_name})
     
     # Stroke layer data defined properties
-    stroke_data_props = etree.SubElement(stroke_layer, 'data_defined_properties')
-    stroke_option_elem = etree.SubElement(stroke_data_props, 'Option')
-    stroke_option_elem.set('type', 'Map')
-    
-    stroke_name_option = etree.SubElement(stroke_option_elem, 'Option')
-    stroke_name_option.set('type', 'QString')
-    stroke_name_option.set('value', '')
-    stroke_name_option.set('name', 'name')
-    
-    stroke_props_option = etree.SubElement(stroke_option_elem, 'Option')
-    stroke_props_option.set('name', 'properties')
-    
-    stroke_type_option = etree.SubElement(stroke_option_elem, 'Option')
-    stroke_type_option.set('type', 'QString')
-    stroke_type_option.set('value', 'collection')
-    stroke_type_option.set('name', 'type')
+    stroke_layer.append(deepcopy(_DATA_DEFINED_PROPERTIES))
     
     # Main layer (second layer, pass 1)
-    main_layer = etree.SubElement(symbol, 'layer')
-    main_layer.set('pass', '1')
-    main_layer.set('enabled', '1')
-    main_layer.set('class', 'SimpleLine')
-    main_layer.set('locked', '0')
+    main_layer = etree.SubElement(symbol, 'layer', attrib={
+        'pass': '1', 'enabled': '1', 'class': 'SimpleLine', 'locked': '0'
+    })
     
-    main_option = etree.SubElement(main_layer, 'Option')
-    main_option.set('type', 'Map')
+    main_option = etree.SubElement(main_layer, 'Option', attrib={'type': 'Map'})
     
     # Main layer properties
-    main_width = stroke_width * main_width_ratio
     main_props = {
         'align_dash_pattern': '0',
         'capstyle': 'round',
@@ -297,9 +269,9 @@ def create_qgis_symbol(road_info, main_width_ratio=0.8):
         'dash_pattern_offset_unit': 'MM',
         'draw_inside_polygon': '0',
         'joinstyle': 'round',
-        'line_color': hex_to_rgb(road_info['color']),
+        'line_color': '',
         'line_style': 'solid',
-        'line_width': f"{main_width:.5f}",
+        'line_width': '',
         'line_width_unit': 'MM',
         'offset': '0',
         'offset_map_unit_scale': '3x:0,0,0,0,0,0',
@@ -317,36 +289,58 @@ def create_qgis_symbol(road_info, main_width_ratio=0.8):
     }
     
     for prop_name, prop_value in main_props.items():
-        prop_elem = etree.SubElement(main_option, 'Option')
-        prop_elem.set('type', 'QString')
-        prop_elem.set('value', prop_value)
-        prop_elem.set('name', prop_name)
+        etree.SubElement(main_option, 'Option', attrib={'type': 'QString', 'value': prop_value, 'name': prop_name})
     
     # Main layer data defined properties
-    main_data_props = etree.SubElement(main_layer, 'data_defined_properties')
-    main_option_elem = etree.SubElement(main_data_props, 'Option')
-    main_option_elem.set('type', 'Map')
+    main_layer.append(deepcopy(_DATA_DEFINED_PROPERTIES))
     
-    main_name_option = etree.SubElement(main_option_elem, 'Option')
-    main_name_option.set('type', 'QString')
-    main_name_option.set('value', '')
-    main_name_option.set('name', 'name')
-    
-    main_props_option = etree.SubElement(main_option_elem, 'Option')
-    main_props_option.set('name', 'properties')
+    return symbol
+
+def _child_path(root, elem):
+    """Return the child indexes leading from root down to elem."""
+    path = []
+    while elem is not root:
+        parent = elem.getparent()
+        path.append(parent.index(elem))
+        elem = parent
+    return tuple(reversed(path))
+
+def _follow_path(elem, path):
+    """Return the descendant of elem reached through the child indexes in path."""
+    for index in path:
+        elem = elem[index]
+    return elem
+
+# Built once and cloned for every road, only the road specific options are
+# filled in on the clone, located by their position in the template
+_LINE_SYMBOL_TEMPLATE = create_line_symbol_template()
+_STROKE_WIDTH_PATH = _child_path(
+    _LINE_SYMBOL_TEMPLATE, _LINE_SYMBOL_TEMPLATE.xpath("layer[1]/Option/Option[@name='line_width']")[0]
+)
+_MAIN_COLOR_PATH = _child_path(
+    _LINE_SYMBOL_TEMPLATE, _LINE_SYMBOL_TEMPLATE.xpath("layer[2]/Option/Option[@name='line_color']")[0]
+)
+_MAIN_WIDTH_PATH = _child_path(
+    _LINE_SYMBOL_TEMPLATE, _LINE_SYMBOL_TEMPLATE.xpath("layer[2]/Option/Option[@name='line_width']")[0]
+)
+
+def create_qgis_symbol(road_info, main_width_ratio=0.8):
+    """Create a QGIS line symbol XML element."""
+    stroke_width = road_info.get('stroke_width', 1.5)  # Use extracted width
     
-    main_type_option = etree.SubElement(main_option_elem, 'Option')
-    main_type_option.set('type', 'QString')
-    main_type_option.set('value', 'collection')
-    main_type_option.set('name', 'type')
+    symbol = deepcopy(_LINE_SYMBOL_TEMPLATE)
+    symbol.set('name', road_info['symbol_name'])
+    _follow_path(symbol, _STROKE_WIDTH_PATH).set('value', str(stroke_width))
+    _follow_path(symbol, _MAIN_COLOR_PATH).set('value', hex_to_rgb(road_info['color']))
+    _follow_path(symbol, _MAIN_WIDTH_PATH).set('value', f"{stroke_width * main_width_ratio:.5f}")
     
     return symbol
 
-def generate_qgis_style(osmand_xml_path, output_path):
-    """Generate QGIS style XML from OsmAnd rendering XML."""
+def generate_qgis_style(osmand_xml_path, output_path, pretty=False):
+    """Generate QGIS style XML from OsmAnd rendering XML, indented only if pretty is set."""
     
-    # Parse OsmAnd XML
-    tree = etree.parse(osmand_xml_path)
+    # Parse OsmAnd XML, sharing the tree with other converters in this process
+    tree = load_osmand_tree(osmand_xml_path)
     root = tree.getroot()
     
     # Extract color definitions
@@ -358,11 +352,7 @@ def generate_qgis_style(osmand_xml_path, output_path):
     print(f"Found {len(roads)} road types")
     
     # Create QGIS style XML
-    qgis_style = etree.Element('qgis_style')
-    qgis_style.set('version', '2')
-    
-    # Add DOCTYPE
-    doctype = '<!DOCTYPE qgis_style>'
+    qgis_style = etree.Element('qgis_style', attrib={'version': '2'})
     
     symbols = etree.SubElement(qgis_style, 'symbols')
     
@@ -380,21 +370,29 @@ def generate_qgis_style(osmand_xml_path, output_path):
     legendpatchshapes = etree.SubElement(qgis_style, 'legendpatchshapes')
     symbols3d = etree.SubElement(qgis_style, 'symbols3d')
     
-    # Write to file
-    with open(output_path, 'wb') as f:
-        f.write(doctype.encode() + b'\n')
-        f.write(etree.tostring(qgis_style, pretty_print=True, xml_declaration=False, encoding='utf-8'))
+    # Write to file, letting lxml emit the XML declaration and DOCTYPE
+    etree.ElementTree(qgis_style).write(
+        output_path,
+        pretty_print=pretty,
+        xml_declaration=True,
+        encoding='utf-8',
+        doctype='<!DOCTYPE qgis_style>'
+    )
     
     print(f"Generated QGIS style with {len(roads)} road symbols: {output_path}")
 
 def main():
-    osmand_xml = os.path.join("OsmAnd-resources", "rendering_styles", "default.render.xml")
+    parser = argparse.ArgumentParser(description="Convert OsmAnd road styles to a QGIS style XML file.")
+    parser.add_argument('--pretty', action='store_true', help="indent the output XML")
+    args = parser.parse_args()
+    
+    osmand_xml = OSMAND_XML
     output_xml = os.path.join("examples", "roads.xml")
     
     # Create output directory if it doesn't exist
     os.makedirs(os.path.dirname(output_xml), exist_ok=True)
     
-    generate_qgis_style(osmand_xml, output_xml)
+    generate_qgis_style(osmand_xml, output_xml, pretty=args.pretty)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Shared access to the OSMAnd rendering style XML and resource paths.
+
+The point and road converters both read OsmAnd-resources' default.render.xml.
+load_osmand_tree() keeps the last parsed tree so that running both converters
+in one process parses the file only once.
+"""
+
+from lxml import etree
+import functools
+import os
+
+OSMAND_XML = os.path.join("OsmAnd-resources", "rendering_styles", "default.render.xml")
+ICONS_DIR = os.path.join("OsmAnd-resources", "rendering_styles", "style-icons", "poi-icons-svg")
+SHIELDS_DIR = os.path.join("OsmAnd-resources", "icons", "svg", "shields")
+
+@functools.lru_cache(maxsize=1)
+def _parse_osmand_xml(path, mtime):
+    """Parse the XML file, mtime only takes part in the cache key."""
+    return etree.parse(path)
+
+def load_osmand_tree(path=OSMAND_XML):
+    """Parse the OSMAnd rendering XML, reusing the last tree while the file is unchanged."""
+    return _parse_osmand_xml(path, os.path.getmtime(path))